@@ -29,177 +29,316 @@
 #
 # =================================================================
 
+# Requires Python 3.9 or later (asyncio.to_thread, Executor.shutdown with
+# cancel_futures)
+
+import io
 import os
+import sys
+import json
+import asyncio
 import logging
-import xml.etree.ElementTree as et
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+
+# lxml is only preferred because its iterparse can skip everything but
+# the sections parse_swob reads, element access is otherwise slower than
+# ElementTree for SWOB sized documents
+try:
+    from lxml import etree as et
+except ImportError:
+    import xml.etree.ElementTree as et
+
+try:
+    import aiofiles
+except ImportError:
+    aiofiles = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 LOGGER = logging.getLogger(__name__)
 
+NAMESPACES = {'gml': 'http://www.opengis.net/gml',
+              'om': 'http://www.opengis.net/om/1.0',
+              'xlink': 'http://www.w3.org/1999/xlink',
+              'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+              'dset': 'http://dms.ec.gc.ca/schema/point-observation/2.0'}
+
+# subtrees of the observation we extract data from
+GEN_TAG = '{{{}}}general'.format(NAMESPACES['dset'])
+ID_TAG = '{{{}}}identification-elements'.format(NAMESPACES['dset'])
+S_TIME_TAG = '{{{}}}samplingTime'.format(NAMESPACES['om'])
+R_TIME_TAG = '{{{}}}resultTime'.format(NAMESPACES['om'])
+RES_TAG = '{{{}}}elements'.format(NAMESPACES['dset'])
+SECTION_TAGS = frozenset([GEN_TAG, ID_TAG, S_TIME_TAG, R_TIME_TAG, RES_TAG])
+
+TIME_PATH = 'gml:TimeInstant/gml:timePosition'
+
+# identification elements holding the station coordinates, by their
+# position in the geojson point
+COORDINATE_INDEX = {'long': 0, 'lat': 1, 'stn_elev': 2}
+
+# result elements that qualify the data piece preceding them
+QUALIFIER_NAMES = frozenset(['qa_summary', 'data_flag'])
 
-def parse_swob(swob_file):
+# lxml can compile the path once and only hand the section elements to
+# python, ElementTree caches the path internally and takes no parser
+# options
+if hasattr(et, 'XPath'):
+    _time_position_text = et.XPath('string({})'.format(TIME_PATH),
+                                   namespaces=NAMESPACES,
+                                   smart_strings=False)
+    _ITERPARSE_OPTIONS = {'remove_blank_text': True,
+                          'remove_comments': True,
+                          'remove_pis': True,
+                          'collect_ids': False,
+                          'tag': tuple(SECTION_TAGS)}
+else:
+    def _time_position_text(time_tree):
+        return time_tree.findtext(TIME_PATH, '', NAMESPACES)
+    _ITERPARSE_OPTIONS = {}
+
+
+@dataclass
+class SwobObservation:
+    """
+    Observation extracted from a SWOB
+    """
+
+    coordinates: list
+    properties: dict
+
+
+@lru_cache(maxsize=256)
+def _localname(tag):
+    """
+    Strip the namespace from a tag in Clark notation
+    :param tag: element tag, i.e. {namespace}name
+    :returns: local name of the tag
+    """
+
+    i = tag.find('}')
+    return tag[i + 1:] if i >= 0 else tag
+
+
+def _parse_general(general_info_tree, properties):
+    """
+    Extract the general info of a swob into properties
+    :param general_info_tree: dset:general element of the SWOB
+    :param properties: dictionary of SWOB properties to update
+    """
+
+    # extract swob dataset, general info is flat so only its children
+    # need to be visited
+    for element in general_info_tree:
+        if 'name' in element.attrib.keys():
+            tag_name = _localname(element.tag)
+            if tag_name == 'dataset':
+                properties[tag_name] = element.attrib['name'].replace('/', '-')
+
+
+def _parse_identification(identification_tree, properties):
+    """
+    Extract the identification elements of a swob into properties
+    :param identification_tree: dset:identification-elements element
+                                of the SWOB
+    :param properties: dictionary of SWOB properties to update
+    :returns: list of station coordinates (longitude, latitude, elevation)
+    """
+
+    coordinates = ['', '', '']
+
+    # identification is flat, only its children need to be visited
+    for element in identification_tree:
+        attrib = element.attrib
+        if 'name' not in attrib:
+            continue
+
+        element_name = ''
+        for key, value in attrib.items():
+            if key == 'name':
+                index = COORDINATE_INDEX.get(value)
+                if index is not None:
+                    coordinates[index] = float(attrib['value'])
+                    break
+                element_name = value
+            else:
+                key_name = sys.intern("{}-{}".format(element_name, key))
+                properties[key_name] = value
+
+    return coordinates
+
+
+def _parse_results(result_tree, properties):
+    """
+    Extract the result data of a swob into properties
+    :param result_tree: dset:elements element of the SWOB result
+    :param properties: dictionary of SWOB properties to update
+    """
+
+    last_element = ''
+    for element in result_tree.iter():
+        attrib = element.attrib
+        name = attrib.get('name')
+        if name is None:
+            continue
+        name = sys.intern(name)
+
+        value = attrib.get('value', '')
+        if value:
+            # Checks to see if value string can be casted to float/int
+            try:
+                if '.' in value:
+                    value = float(value)
+                else:
+                    value = int(value)
+            except ValueError:
+                # formatted by logging only when debug output is enabled
+                LOGGER.debug('Warning the value: "%s" could not be ' +
+                             'converted to a number, this can be because ' +
+                             'of an improperly formatted number value or ' +
+                             'because of an intentional string value', value)
+
+        uom = attrib.get('uom', '')
+        if uom == 'unitless':
+            uom = ''
+        else:
+            uom = sys.intern(uom.replace('\u00c2', ''))
+
+        # element can be 1 of 3 things:
+        #   1. a data piece
+        #   2. a qa summary
+        #   3. a data flag
+        if name not in QUALIFIER_NAMES:
+            properties[name] = value
+            if uom:
+                properties[sys.intern("{}-{}".format(name, 'uom'))] = uom
+            last_element = name
+        elif name == 'qa_summary':
+            properties[sys.intern("{}-{}".format(last_element, 'qa'))] = value
+        elif name == 'data_flag':
+            flag_prefix = '{}-data_flag-'.format(last_element)
+            properties[sys.intern(flag_prefix + 'uom')] = uom
+            properties[sys.intern(flag_prefix + 'code_src')] = (
+                attrib['code-src'])
+            properties[sys.intern(flag_prefix + 'value')] = value
+
+
+def parse_swob(swob_file, swob_data=None):
     """
     Read swob at swob_path and return object
+
+    Parsing stops as soon as the sections we extract data from have been
+    read, so the remainder of the document is not checked: a SWOB
+    truncated or malformed after its om:result converts without error.
+
     :param swob_path: file path to SWOB XML
+    :param swob_data: content of the SWOB XML as bytes, read from
+                      swob_path when not provided
     :returns: dictionary of SWOB
     """
 
-    namespaces = {'gml': 'http://www.opengis.net/gml',
-                  'om': 'http://www.opengis.net/om/1.0',
-                  'xlink': 'http://www.w3.org/1999/xlink',
-                  'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
-                  'dset': 'http://dms.ec.gc.ca/schema/point-observation/2.0'}
-
     swob_values = {}
-    elevation = ''
-    latitude = ''
-    longitude = ''
+    properties = {}
+    coordinates = ['', '', '']
 
     # extract the swob xml source name
     swob_name = os.path.basename(swob_file)
 
-    # make sure the xml is parse-able
+    pending = set(SECTION_TAGS)
+
+    # stream the xml, handling each subtree as soon as it is complete
+    # and stopping once all of them have been read
     try:
-        xml_tree = et.parse(swob_file)
-    except (FileNotFoundError, et.ParseError):
+        if swob_data is None:
+            swob_fh = open(swob_file, 'rb')
+        else:
+            swob_fh = io.BytesIO(swob_data)
+
+        with swob_fh:
+            for event, elem in et.iterparse(swob_fh, events=('end',),
+                                            **_ITERPARSE_OPTIONS):
+                if elem.tag not in pending:
+                    continue
+                pending.discard(elem.tag)
+
+                if elem.tag == GEN_TAG:
+                    _parse_general(elem, properties)
+                    # add swob source name to properties
+                    properties["id"] = swob_name
+                elif elem.tag == ID_TAG:
+                    coordinates = _parse_identification(elem, properties)
+                elif elem.tag == S_TIME_TAG:
+                    properties['obs_date_tm'] = _time_position_text(elem)
+                elif elem.tag == R_TIME_TAG:
+                    properties['processed_date_tm'] = (
+                        _time_position_text(elem))
+                else:
+                    _parse_results(elem, properties)
+
+                elem.clear()
+                if not pending:
+                    break
+    except (OSError, et.ParseError) as err:
         msg = 'Error: file {} cannot be parsed as xml'.format(swob_file)
         LOGGER.debug(msg)
-        raise RuntimeError(msg)
+        raise RuntimeError(msg) from err
 
-    gen_path = './/om:Observation/om:metadata/dset:set/dset:general'
-    general_info_tree = (xml_tree.findall(gen_path, namespaces))
-    general_info_elements = list(general_info_tree[0].iter())
-    properties = {}
+    if pending:
+        missing = sorted(_localname(tag) for tag in pending)
+        msg = 'Error: file {} lacks required sections: {}'.format(
+            swob_file, ', '.join(missing))
+        LOGGER.debug(msg)
+        raise RuntimeError(msg)
 
-    # extract swob dataset
-    for element in general_info_elements:
-        if 'name' in element.attrib.keys():
-            if element.tag.split('}')[1] == 'dataset':
-                properties[element.tag.split('}')[1]] = (
-                    element.attrib['name'].replace('/', '-'))
+    # set up cords
+    swob_values['coordinates'] = coordinates
+    swob_values['properties'] = properties
 
-    # add swob source name to properties
-    properties["id"] = swob_name
+    return swob_values
 
-    # extract ID related properties
-    id_path = ('.//om:Observation/om:metadata/' +
-               'dset:set/dset:identification-elements')
-    identification_tree = xml_tree.findall(id_path, namespaces)
-    identification_elements = list(identification_tree[0].iter())
 
-    for element in identification_elements:
-        element_name = ''
-        if 'name' in element.attrib.keys():
-            for key in element.attrib.keys():
-                if key == 'name':
-                    if element.attrib[key] == 'stn_elev':
-                        elevation = float(element.attrib['value'])
-                        break
-                    elif element.attrib[key] == 'lat':
-                        latitude = float(element.attrib['value'])
-                        break
-                    elif element.attrib[key] == 'long':
-                        longitude = float(element.attrib['value'])
-                        break
-                    else:
-                        element_name = element.attrib[key]
-                else:
-                    properties["{}-{}".format(element_name, key)] = (
-                            element.attrib[key])
-
-    # set up cords and time stamps
-    swob_values['coordinates'] = [longitude, latitude, elevation]
+def parse_swob_observation(swob_file, swob_data=None):
+    """
+    Read swob at swob_file and return observation
+    :param swob_file: file path to SWOB XML
+    :param swob_data: content of the SWOB XML as bytes, read from
+                      swob_file when not provided
+    :returns: SwobObservation of SWOB
+    """
 
-    s_time = ('.//om:Observation/om:samplingTime/' +
-              'gml:TimeInstant/gml:timePosition')
-    time_sample = list(xml_tree.findall(s_time, namespaces)[0].iter())[0]
-    properties['obs_date_tm'] = time_sample.text
+    swob_dict = parse_swob(swob_file, swob_data)
 
-    r_time = ('.//om:Observation/om:resultTime/' +
-              'gml:TimeInstant/gml:timePosition')
-    time_result = list(xml_tree.findall(r_time, namespaces)[0].iter())[0]
-    properties['processed_date_tm'] = time_result.text
+    return SwobObservation(swob_dict['coordinates'],
+                           swob_dict['properties'])
 
-    # extract the result data from the swob
-    res_path = './/om:Observation/om:result/dset:elements'
-    result_tree = xml_tree.findall(res_path, namespaces)
-    result_elements = list(result_tree[0].iter())
 
-    last_element = ''
-    for element in result_elements:
-        nested = element.iter()
-        for nest_elem in nested:
-            value = ''
-            uom = ''
-            if 'name' in nest_elem.attrib.keys():
-                name = nest_elem.attrib['name']
-                if 'value' in nest_elem.attrib.keys():
-                    value = nest_elem.attrib['value']
-                    
-                    # Checks to see if value string can be casted to float/int
-                    try:
-                        if '.' in value:
-                            value = float(value)
-                        else:
-                            value = int(value)
-                    except ValueError:
-                        msg = (('Warning the value: "{}" could not be ' +
-                               'converted to a number, this can be because ' +
-                               'of an improperly formatted number value or ' +
-                               'because of an intentional string value')
-                               .format(value))
-                        LOGGER.debug(msg)
-                        pass
-
-                if 'uom' in nest_elem.attrib.keys():
-                    if nest_elem.attrib['uom'] != 'unitless':
-                        uom = nest_elem.attrib['uom'].replace('\u00c2', '')
-
-                # element can be 1 of 3 things:
-                #   1. a data piece
-                #   2. a qa summary
-                #   3. a data flag
-                if all([name != 'qa_summary', name != 'data_flag']):
-                    properties[name] = value
-                    if uom:
-                        properties["{}-{}".format(name, 'uom')] = uom
-                    last_element = name
-                elif name == 'qa_summary':
-                    properties["{}-{}".format(last_element, 'qa')] = value
-                elif name == 'data_flag':
-                    properties["{}-{}-{}".format(last_element, 'data_flag',
-                                                 'uom')] = uom
-                    properties["{}-{}-{}".format(last_element, 'data_flag',
-                                                 'code_src')] = (
-                        nest_elem.attrib['code-src'])
-                    properties["{}-{}-{}".format(last_element, 'data_flag',
-                                                 'value')] = (
-                            value)
-
-        swob_values['properties'] = properties
-
-        return swob_values
-
-
-def swob2geojson(swob_file):
+def swob2geojson(swob_file, swob_data=None):
     """
     Produce GeoJSON from dict
     :param swob_dict: swob in memory
+    :param swob_data: content of the SWOB XML as bytes, read from
+                      swob_file when not provided
     :returns: geojson
     """
 
-    swob_dict = parse_swob(swob_file)
+    swob_dict = parse_swob(swob_file, swob_data)
     json_output = {}
 
-    try:
-        if len(swob_dict) == 0:
-            msg = ('Error: dictionary passed into swob2geojson is blank')
-            LOGGER.debug(msg)
-            raise RuntimeError(msg)
-    except TypeError:
+    if swob_dict is None:
         msg = "Error: NoneType passed in as swob dict"
         LOGGER.debug(msg)
         raise RuntimeError(msg)
 
+    if len(swob_dict) == 0:
+        msg = ('Error: dictionary passed into swob2geojson is blank')
+        LOGGER.debug(msg)
+        raise RuntimeError(msg)
+
     # verify dictionary contains the data we need to avoid error
     if 'properties' in swob_dict.keys() and 'coordinates' in swob_dict.keys():
         json_output['type'] = 'Feature'
@@ -212,3 +351,171 @@ def swob2geojson(swob_file):
                ' required fields')
         LOGGER.debug(msg)
         raise RuntimeError(msg)
+
+
+def swob2geojson_bytes(swob_file, swob_data=None):
+    """
+    Produce serialized GeoJSON from swob, using orjson when available
+    :param swob_file: file path to SWOB XML
+    :param swob_data: content of the SWOB XML as bytes, read from
+                      swob_file when not provided
+    :returns: geojson as UTF-8 encoded bytes
+    """
+
+    geojson = swob2geojson(swob_file, swob_data)
+
+    if orjson is not None:
+        return orjson.dumps(geojson)
+
+    # match the compact output of orjson
+    return json.dumps(geojson, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf8')
+
+
+def swob2geojson_batch(swob_files, workers=None, as_bytes=False):
+    """
+    Produce GeoJSON from many SWOBs using a pool of worker processes
+    :param swob_files: iterable of file paths to SWOB XML
+    :param workers: number of worker processes, defaults to the CPU count
+    :param as_bytes: serialize the geojson in the workers, see
+                     swob2geojson_bytes
+    :returns: generator of geojson, in the same order as swob_files
+    """
+
+    convert = swob2geojson_bytes if as_bytes else swob2geojson
+
+    with ProcessPoolExecutor(workers) as pool:
+        yield from pool.map(convert, swob_files, chunksize=32)
+
+
+def swob2columns(swob_files, workers=None):
+    """
+    Produce a column oriented table from many SWOBs using a pool of
+    worker processes, i.e. to load into pandas or pyarrow
+    :param swob_files: iterable of file paths to SWOB XML
+    :param workers: number of worker processes, defaults to the CPU count
+    :returns: dictionary of columns, with one row per SWOB in the same
+              order as swob_files and None where a property is missing.
+              The station coordinates are in the longitude, latitude and
+              elevation columns, which properties cannot override
+    """
+
+    coordinate_columns = ('longitude', 'latitude', 'elevation')
+    columns = {name: [] for name in coordinate_columns}
+    rows = 0
+
+    with ProcessPoolExecutor(workers) as pool:
+        observations = pool.map(parse_swob_observation, swob_files,
+                                chunksize=32)
+        for observation in observations:
+            for name, value in zip(coordinate_columns,
+                                   observation.coordinates):
+                columns[name].append(value)
+
+            for name, value in observation.properties.items():
+                if name in coordinate_columns:
+                    LOGGER.debug('Warning the property "%s" clashes with a ' +
+                                 'coordinate column and is skipped', name)
+                    continue
+                if name not in columns:
+                    columns[name] = [None] * rows
+                columns[name].append(value)
+
+            rows += 1
+            for column in columns.values():
+                if len(column) < rows:
+                    column.append(None)
+
+    return columns
+
+
+def _swob2geojson_many(swob_files, swob_data):
+    """
+    Produce GeoJSON from several SWOBs already read into memory
+    :param swob_files: list of file paths to SWOB XML
+    :param swob_data: list with the content of each SWOB XML as bytes
+    :returns: list of geojson, in the same order as swob_files
+    """
+
+    return [swob2geojson(swob_file, data)
+            for swob_file, data in zip(swob_files, swob_data)]
+
+
+async def _read_swob(swob_file):
+    """
+    Read the content of a SWOB without blocking the event loop
+    :param swob_file: file path to SWOB XML
+    :returns: content of the SWOB XML as bytes
+    """
+
+    def read_bytes():
+        with open(swob_file, 'rb') as swob_fh:
+            return swob_fh.read()
+
+    try:
+        if aiofiles is not None:
+            async with aiofiles.open(swob_file, 'rb') as swob_fh:
+                return await swob_fh.read()
+
+        return await asyncio.to_thread(read_bytes)
+    except OSError as err:
+        msg = 'Error: file {} cannot be parsed as xml'.format(swob_file)
+        LOGGER.debug(msg)
+        raise RuntimeError(msg) from err
+
+
+async def swob2geojson_async(swob_files, workers=None, batch_size=64):
+    """
+    Produce GeoJSON from many SWOBs, reading the next batch of files
+    while the current one is being parsed by a pool of worker processes
+    :param swob_files: iterable of file paths to SWOB XML
+    :param workers: number of worker processes, defaults to the CPU count
+    :param batch_size: number of files read concurrently
+    :returns: list of geojson, in the same order as swob_files
+    """
+
+    loop = asyncio.get_running_loop()
+    swob_files = list(swob_files)
+    batches = [swob_files[i:i + batch_size]
+               for i in range(0, len(swob_files), batch_size)]
+    geojson = []
+
+    if not batches:
+        return geojson
+
+    def start_reads(batch):
+        return [asyncio.ensure_future(_read_swob(f)) for f in batch]
+
+    # hand each worker one slice of the batch rather than one file per task
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(workers)
+    reads = start_reads(batches[0])
+    next_reads = []
+    try:
+        for i, batch in enumerate(batches):
+            buffers = await asyncio.gather(*reads)
+            if i + 1 < len(batches):
+                next_reads = start_reads(batches[i + 1])
+
+            step = -(-len(batch) // workers)
+            conversions = [
+                loop.run_in_executor(pool, _swob2geojson_many,
+                                     batch[j:j + step], buffers[j:j + step])
+                for j in range(0, len(batch), step)]
+            for converted in await asyncio.gather(*conversions):
+                geojson.extend(converted)
+            reads, next_reads = next_reads, []
+    except BaseException:
+        # drop queued conversions without waiting on the running ones, and
+        # stop the reads still in flight and collect their outcome
+        pool.shutdown(wait=False, cancel_futures=True)
+        pending = reads + next_reads
+        for read in pending:
+            read.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        raise
+
+    # every conversion is done, wait for the workers off the event loop
+    await loop.run_in_executor(None, pool.shutdown)
+
+    return geojson
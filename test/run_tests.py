@@ -28,6 +28,7 @@
 #
 # =================================================================
 
+import asyncio
 import unittest
 import json
 import swob2geojson as swob2gjson
@@ -103,6 +104,116 @@ class Sob2GeoJsonTest(unittest.TestCase):
         self.assertEqual(swob2gjson.swob2geojson(test_file),
                          master_geojson)
 
+    def test_batch_bytes(self):
+        """Test converting several swobs into serialized geojson in parallel"""
+
+        test_files = ['swob/2020-07-14-0300-CABB-AUTO-swob.xml',
+                      'swob/2020-06-08-0000-CPOX-AUTO-minute-swob.xml']
+        master_files = ['geojson/CABB_swob_master.json',
+                        'geojson/CPOX_minute_master.json']
+        master_geojson = [read_json(master) for master in master_files]
+        geojson = swob2gjson.swob2geojson_batch(test_files, 2, as_bytes=True)
+        self.assertEqual([json.loads(feature) for feature in geojson],
+                         master_geojson)
+
+    def test_unparseable(self):
+        """Test converting missing and malformed swobs raises an error"""
+
+        with self.assertRaises(RuntimeError):
+            swob2gjson.swob2geojson('swob/missing-swob.xml')
+        with self.assertRaises(RuntimeError):
+            swob2gjson.swob2geojson('swob.xml', b'<om:ObservationCollection')
+
+    def test_missing_section(self):
+        """Test converting a swob lacking a required section raises an error"""
+
+        test_file = 'swob/2020-07-14-0300-CABB-AUTO-swob.xml'
+        with open(test_file, 'rb') as fp:
+            swob_data = fp.read()
+        start = swob_data.index(b'<identification-elements>')
+        end = (swob_data.index(b'</identification-elements>') +
+               len(b'</identification-elements>'))
+        with self.assertRaisesRegex(RuntimeError, 'identification-elements'):
+            swob2gjson.swob2geojson(test_file,
+                                    swob_data[:start] + swob_data[end:])
+
+    def test_truncated_after_result(self):
+        """Test a swob truncated after its result still converts"""
+
+        test_file = 'swob/2020-07-14-0300-CABB-AUTO-swob.xml'
+        master_file = 'geojson/CABB_swob_master.json'
+        master_geojson = read_json(master_file)
+        with open(test_file, 'rb') as fp:
+            swob_data = fp.read()
+        end_result = swob_data.index(b'</om:result>') + len(b'</om:result>')
+        self.assertEqual(swob2gjson.swob2geojson(test_file,
+                                                 swob_data[:end_result]),
+                         master_geojson)
+
+    def test_batch(self):
+        """Test converting several swobs into geojson in parallel"""
+
+        test_files = ['swob/2020-07-01-0007-CGCH-AUTO-minute-swob.xml',
+                      'swob/2020-05-31-0200-CYBQ-AUTO-swob.xml']
+        master_files = ['geojson/CGCH_minute_master.json',
+                        'geojson/CYBQ_swob_master.json']
+        master_geojson = [read_json(master) for master in master_files]
+        self.assertEqual(list(swob2gjson.swob2geojson_batch(test_files, 2)),
+                         master_geojson)
+
+    def test_columns(self):
+        """Test converting several swobs into a column oriented table"""
+
+        test_files = ['swob/2020-07-14-0300-CABB-AUTO-swob.xml',
+                      'swob/2020-07-14-0418-CAVA-AUTO-minute-swob.xml']
+        master_files = ['geojson/CABB_swob_master.json',
+                        'geojson/CAVA_minute_master.json']
+        master_geojson = [read_json(master) for master in master_files]
+        columns = swob2gjson.swob2columns(test_files, 2)
+
+        for row, master in enumerate(master_geojson):
+            longitude, latitude, elevation = (
+                master['geometry']['coordinates'])
+            self.assertEqual(columns['longitude'][row], longitude)
+            self.assertEqual(columns['latitude'][row], latitude)
+            self.assertEqual(columns['elevation'][row], elevation)
+            for name, column in columns.items():
+                self.assertEqual(len(column), len(master_geojson))
+                if name in master['properties']:
+                    self.assertEqual(column[row], master['properties'][name])
+
+        # data_avail is only reported by the hourly CABB swob
+        self.assertEqual(columns['data_avail'][0],
+                         master_geojson[0]['properties']['data_avail'])
+        self.assertIsNone(columns['data_avail'][1])
+
+    def test_bytes(self):
+        """Test converting CNCO minute swob into serialized geojson"""
+
+        test_file = 'swob/2020-07-14-0052-CNCO-AUTO-minute-swob.xml'
+        master_file = 'geojson/CNCO_minute_master.json'
+        master_geojson = read_json(master_file)
+        self.assertEqual(json.loads(swob2gjson.swob2geojson_bytes(test_file)),
+                         master_geojson)
+
+    def test_async(self):
+        """Test converting several swobs into geojson with async reads"""
+
+        test_files = ['swob/2020-07-01-0007-CAFC-AUTO-minute-swob.xml',
+                      'swob/2020-06-08-0000-CPOX-AUTO-minute-swob.xml',
+                      'swob/2020-06-08-0000-CAAW-AUTO-minute-swob.xml']
+        master_files = ['geojson/CAFC_minute_master.json',
+                        'geojson/CPOX_minute_master.json',
+                        'geojson/CAAW_minute_master.json']
+        master_geojson = [read_json(master) for master in master_files]
+        self.assertEqual(
+            asyncio.run(swob2gjson.swob2geojson_async(test_files, 2, 2)),
+            master_geojson)
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(swob2gjson.swob2geojson_async(
+                ['swob/missing-swob.xml'] + test_files, 2, 1))
+
 
 # main
 if __name__ == '__main__':